@@ -0,0 +1,286 @@
+"""Local stand-ins for the external services the agents' tools call."""
+import base64
+import json
+import re
+import threading
+import time
+from email.message import EmailMessage
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import httplib2
+from googleapiclient.discovery import build
+
+# (method, path regex) -> handler(match, query, body) -> (status, headers, body bytes)
+Route = Tuple[str, str, Callable]
+
+
+class _Server(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connections when concurrent sessions
+    # connect at once, and the client only retries after a 1s SYN timeout.
+    request_queue_size = 128
+
+
+class FakeHTTPService:
+    """
+    Serves canned JSON responses on a local port from a background thread.
+
+    Args:
+        routes: (method, path regex, handler) tuples. Handlers receive the
+            path match, the parsed query string and the request body.
+        latency: Seconds to wait before answering each request.
+    """
+
+    def __init__(self, routes: List[Route], latency: float = 0.0):
+        self.routes = [(method, re.compile(pattern), handler) for method, pattern, handler in routes]
+        self.latency = latency
+        self.request_count = 0
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _dispatch(self, method):
+                service.request_count += 1
+                parsed = urlparse(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                for route_method, pattern, handler in service.routes:
+                    match = pattern.fullmatch(parsed.path)
+                    if route_method == method and match:
+                        if service.latency:
+                            time.sleep(service.latency)
+                        status, headers, payload = handler(match, parse_qs(parsed.query), body)
+                        break
+                else:
+                    status, headers, payload = 404, {}, b'{"error": "not found"}'
+                self.send_response(status)
+                self.send_header("Content-Type", headers.get("Content-Type", "application/json"))
+                self.send_header("Content-Length", str(len(payload)))
+                for key, value in headers.items():
+                    if key != "Content-Type":
+                        self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._dispatch("GET")
+
+            def do_POST(self):
+                self._dispatch("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = _Server(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeHTTPService":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _json(payload, status: int = 200) -> Tuple[int, Dict[str, str], bytes]:
+    return status, {}, json.dumps(payload).encode()
+
+
+# -- weatherapi.com --
+def fake_weather_api(latency: float = 0.0) -> FakeHTTPService:
+    def current(match, query, body):
+        city = query.get("q", ["London"])[0]
+        return _json({
+            "location": {"name": city, "country": "Benchland"},
+            "current": {"temp_c": 21.0, "temp_f": 69.8, "condition": {"text": "Partly cloudy"}},
+        })
+
+    return FakeHTTPService([("GET", r"/v1/current\.json", current)], latency)
+
+
+# -- Gemini generateContent (used by translate_response) --
+def fake_gemini_api(latency: float = 0.0) -> FakeHTTPService:
+    def generate(match, query, body):
+        prompt = json.loads(body)["contents"][0]["parts"][0]["text"]
+        return _json({
+            "candidates": [{
+                "content": {"parts": [{"text": prompt[::-1]}], "role": "model"},
+                "finishReason": "STOP",
+            }],
+            "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(prompt) // 4},
+            "modelVersion": "gemini-2.0-flash",
+        })
+
+    return FakeHTTPService([("POST", r"/v1beta/models/[^/]+:generateContent", generate)], latency)
+
+
+# -- Reddit OAuth + listing API (praw is pointed here via REDDIT_OAUTH_URL / REDDIT_URL) --
+def fake_reddit_api(latency: float = 0.0, selftext_chars: int = 2000) -> FakeHTTPService:
+    def token(match, query, body):
+        return _json({"access_token": "bench-token", "token_type": "bearer", "expires_in": 86400, "scope": "*"})
+
+    def search_names(match, query, body):
+        name = parse_qs(body.decode()).get("query", ["news"])[0]
+        return _json({"names": [name, name + "_alt"]})
+
+    def listing(match, query, body):
+        subreddit = match.group(1)
+        limit = int(query.get("limit", ["10"])[0])
+        children = [{
+            "kind": "t3",
+            "data": {
+                "id": f"{subreddit}{i}",
+                "name": f"t3_{subreddit}{i}",
+                "title": f"Benchmark post {i} in r/{subreddit}",
+                "selftext": ("Lorem ipsum dolor sit amet. " * (selftext_chars // 28 + 1))[:selftext_chars],
+                "url": f"https://example.com/{subreddit}/{i}",
+                "permalink": f"/r/{subreddit}/comments/{subreddit}{i}/post_{i}/",
+                "subreddit": subreddit,
+                "created_utc": 1700000000 + i,
+            },
+        } for i in range(limit)]
+        return _json({"kind": "Listing", "data": {"after": None, "before": None, "children": children}})
+
+    return FakeHTTPService([
+        ("POST", r"/api/v1/access_token/?", token),
+        ("POST", r"/api/search_reddit_names/?", search_names),
+        ("GET", r"/r/([^/]+)/(?:search|new)/?", listing),
+    ], latency)
+
+
+# -- googleapiclient (Drive / Gmail) --
+class RoutedHttpMock:
+    """
+    HttpMock-style transport for googleapiclient that answers by URL.
+
+    Unlike googleapiclient.http.HttpMockSequence it is not consumed, so one
+    client can be called any number of times.
+    """
+
+    def __init__(self, routes: List[Route], latency: float = 0.0):
+        self.routes = [(method, re.compile(pattern), handler) for method, pattern, handler in routes]
+        self.latency = latency
+        self.request_count = 0
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=1, connection_type=None):
+        self.request_count += 1
+        parsed = urlparse(uri)
+        if self.latency:
+            time.sleep(self.latency)
+        for route_method, pattern, handler in self.routes:
+            match = pattern.fullmatch(parsed.path)
+            if route_method == method and match:
+                status, response_headers, payload = handler(match, parse_qs(parsed.query), body)
+                break
+        else:
+            status, response_headers, payload = 404, {}, b'{"error": {"code": 404, "message": "not found"}}'
+        response = httplib2.Response({"status": str(status), **response_headers})
+        return response, payload
+
+    def close(self):
+        pass
+
+
+def fake_drive_client(latency: float = 0.0, file_count: int = 50, document_chars: int = 20000):
+    files = [
+        {"id": f"file{i}", "name": f"Benchmark file {i}", "mimeType": "text/plain" if i % 2 else "application/vnd.google-apps.document"}
+        for i in range(file_count)
+    ]
+    by_id = {f["id"]: f for f in files}
+    document = ("Benchmark document line.\n" * (document_chars // 25 + 1))[:document_chars].encode()
+
+    def list_files(match, query, body):
+        page_size = int(query.get("pageSize", ["10"])[0])
+        start = int(query.get("pageToken", ["0"])[0])
+        page = files[start:start + page_size]
+        payload = {"files": page}
+        if start + page_size < len(files):
+            payload["nextPageToken"] = str(start + page_size)
+        return _json(payload)
+
+    def get_file(match, query, body):
+        if query.get("alt") == ["media"]:
+            return 200, {"Content-Type": "text/plain"}, document
+        return _json({"mimeType": by_id.get(match.group(1), files[1])["mimeType"]})
+
+    def export(match, query, body):
+        return 200, {"Content-Type": query.get("mimeType", ["text/plain"])[0]}, document
+
+    http = RoutedHttpMock([
+        ("GET", r"/drive/v3/files", list_files),
+        ("GET", r"/drive/v3/files/([^/]+)/export", export),
+        ("GET", r"/drive/v3/files/([^/]+)", get_file),
+    ], latency)
+    return build("drive", "v3", http=http, static_discovery=True)
+
+
+def fake_gmail_client(latency: float = 0.0, pages: int = 5, page_size: int = 100, body_chars: int = 5000):
+    message = EmailMessage()
+    message["To"] = "me@example.com"
+    message["From"] = "bench@example.com"
+    message["Subject"] = "Benchmark message"
+    message["Date"] = "Mon, 1 Jan 2024 00:00:00 +0000"
+    message.set_content(("Benchmark body text. " * (body_chars // 21 + 1))[:body_chars])
+    raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
+
+    def list_messages(match, query, body):
+        page = int(query.get("pageToken", ["0"])[0])
+        size = min(int(query.get("maxResults", [str(page_size)])[0]), page_size)
+        payload = {
+            "messages": [{"id": f"msg{page}_{i}", "threadId": f"thread{page}_{i}"} for i in range(size)],
+            "resultSizeEstimate": pages * page_size,
+        }
+        if page + 1 < pages:
+            payload["nextPageToken"] = str(page + 1)
+        return _json(payload)
+
+    http = RoutedHttpMock([
+        ("GET", r"/gmail/v1/users/me/profile", lambda m, q, b: _json({"emailAddress": "me@example.com", "messagesTotal": pages * page_size})),
+        ("GET", r"/gmail/v1/users/me/messages", list_messages),
+        ("POST", r"/gmail/v1/users/me/messages/send", lambda m, q, b: _json({"id": "sent1", "threadId": "thread1"})),
+        ("POST", r"/gmail/v1/users/me/messages/([^/]+)/trash", lambda m, q, b: _json({"id": m.group(1), "labelIds": ["TRASH"]})),
+        ("GET", r"/gmail/v1/users/me/messages/([^/]+)", lambda m, q, b: _json({"id": m.group(1), "raw": raw})),
+    ], latency)
+    return build("gmail", "v1", http=http, static_discovery=True)
+
+
+# -- googlemaps --
+class FakeMapsClient:
+    """Drop-in for googlemaps.Client returning canned responses."""
+
+    def __init__(self, latency: float = 0.0, steps: int = 20, places: int = 20):
+        self.latency = latency
+        self.steps = steps
+        self.places = places
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def directions(self, origin, destination, mode="driving", departure_time=None, **kwargs):
+        self._wait()
+        steps = [{"html_instructions": f"Head <b>north</b> for {i} km"} for i in range(self.steps)]
+        return [{"legs": [{"steps": steps}]}]
+
+    def distance_matrix(self, origins, destinations, mode="driving", departure_time=None, **kwargs):
+        self._wait()
+        return {"rows": [{"elements": [{
+            "status": "OK",
+            "distance": {"text": "4.2 km", "value": 4200},
+            "duration": {"text": "15 mins", "value": 900},
+        }]}]}
+
+    def places_nearby(self, location=None, keyword=None, radius=None, **kwargs):
+        self._wait()
+        return {"results": [{"name": f"{keyword} place {i}"} for i in range(self.places)], "status": "OK"}
+
+    def geocode(self, address, **kwargs):
+        self._wait()
+        return [{"geometry": {"location": {"lat": 28.6315, "lng": 77.2167}}}]
@@ -0,0 +1,360 @@
+"""
+Offline benchmark for every agent tool, run against local stand-ins.
+
+Usage (from the repository root):
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --compare results.json
+
+Measures per-tool latency, throughput with concurrent sessions and peak
+memory, and writes machine-readable results that can be compared across
+commits.
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime
+import inspect
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from common.stats import percentile
+
+from . import fakes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_MCP_SERVER = os.path.join(ROOT, "benchmarks", "stub_mcp_server.py")
+
+LONG_TEXT = " ".join(f"word{i}" for i in range(10000))
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def start_services(latency: float) -> Dict[str, fakes.FakeHTTPService]:
+    """Starts the fake HTTP services and points the agents' configuration at them."""
+    services = {
+        "weather": fakes.fake_weather_api(latency).start(),
+        "gemini": fakes.fake_gemini_api(latency).start(),
+        "reddit": fakes.fake_reddit_api(latency).start(),
+    }
+    os.environ.update({
+        "WEATHER_API_KEY": "bench",
+        "WEATHER_API_URL": services["weather"].url + "/v1/current.json",
+        "GOOGLE_API_KEY": "bench",
+        "GEMINI_API_URL": services["gemini"].url + "/v1beta/models/gemini-2.0-flash:generateContent",
+        "REDDIT_CLIENT_ID": "bench",
+        "REDDIT_CLIENT_SECRET": "bench",
+        "REDDIT_USER_AGENT": "benchmark by /u/bench",
+        "REDDIT_OAUTH_URL": services["reddit"].url,
+        "REDDIT_URL": services["reddit"].url,
+        "GOOGLE_MAPS_API_KEY": "AIza-benchmark-key",
+    })
+    # Measure the tools rather than the shared upstream rate limits (common/resilience.py),
+    # unless limits were set explicitly.
+    from common.resilience import SERVICE_LIMITS
+    for service in SERVICE_LIMITS:
+        os.environ.setdefault(f"UPSTREAM_RATE_{service.upper()}", "1000000")
+        os.environ.setdefault(f"UPSTREAM_BURST_{service.upper()}", "1000000")
+    return services
+
+
+def load_tools(latency: float) -> List[Dict]:
+    """Imports the agents with their upstream clients swapped for fakes."""
+    import multi_tool_agent.agent as multi_tool
+    import gsuite.agent as gsuite
+
+    gsuite.get_drive_client = lambda: fakes.fake_drive_client(latency)
+    gsuite.get_gmail_client = lambda: fakes.fake_gmail_client(latency)
+    gsuite.gmaps = fakes.FakeMapsClient(latency)
+
+    # The summarizer agent is imported as the top-level package "app", as `adk web` does.
+    sys.path.insert(0, os.path.join(ROOT, "summarizer"))
+    import app.agent as summarizer
+
+    location = {"lat": 28.6315, "lng": 77.2167}
+    tools = [
+        ("multi_tool_agent", multi_tool.get_weather, {"city": "London"}),
+        ("multi_tool_agent", multi_tool.get_current_time, {"city": "London"}),
+        ("multi_tool_agent", multi_tool.translate_response, {"originalText": "Good morning, how are you?", "lang": "French"}),
+        ("multi_tool_agent", multi_tool.find_relevant_subreddits, {"topic": "technology news"}),
+        ("multi_tool_agent", multi_tool.get_reddit_news, {"subreddit": "technology", "topic": "ai", "limit": 10}),
+        ("multi_tool_agent", multi_tool.get_news_by_topic, {"topic": "technology", "limit": 10}),
+        ("multi_tool_agent", multi_tool.save_text_as_pdf, {"content_to_save": "Benchmark line\n" * 50, "filename": "bench.pdf"}),
+        ("gsuite", gsuite.list_drive_files, {"page_size": 10}),
+        ("gsuite", gsuite.read_drive_file, {"file_id": "file0"}),
+        ("gsuite", gsuite.get_current_user_email_id, {}),
+        ("gsuite", gsuite.send_email, {"sender_id": "me@example.com", "recipient_id": "you@example.com", "subject": "Hi", "message": "Benchmark"}),
+        ("gsuite", gsuite.get_emails, {}),
+        ("gsuite", gsuite.read_email_content, {"email_id": "msg0_0"}),
+        ("gsuite", gsuite.delete_email, {"message_id": "msg0_0"}),
+        ("gsuite", gsuite.get_directions, {"origin": "Connaught Place", "destination": "Khan Market"}),
+        ("gsuite", gsuite.get_distance, {"origin": "Connaught Place", "destination": "Khan Market"}),
+        ("gsuite", gsuite.get_places, {"query": "cafe", "location": location}),
+        ("gsuite", gsuite.get_lat_long, {"address": "Khan Market"}),
+        ("summarizer", summarizer.compute_word_reduction, {"original_text": LONG_TEXT, "summarized_text": "word0 word1"}),
+    ]
+    specs = [{"agent": agent, "tool": fn.__name__, "fn": fn, "kwargs": kwargs} for agent, fn, kwargs in tools]
+    specs.append({
+        "agent": "multi_tool_agent",
+        "tool": "get_voice_response",
+        "skip": "needs ElevenLabs audio synthesis and local playback",
+    })
+    return specs
+
+
+def invoke(fn: Callable, kwargs: dict):
+    if inspect.iscoroutinefunction(fn):
+        return asyncio.run(fn(**kwargs))
+    return fn(**kwargs)
+
+
+def latency_summary(latencies: List[float]) -> dict:
+    latencies = sorted(latencies)
+    return {
+        "mean": round(sum(latencies) / len(latencies) * 1000, 3),
+        "p50": round(percentile(latencies, 50) * 1000, 3),
+        "p95": round(percentile(latencies, 95) * 1000, 3),
+        "max": round(latencies[-1] * 1000, 3),
+    }
+
+
+def bench_tool(spec: dict, iterations: int, sessions: int) -> dict:
+    result = {"agent": spec["agent"], "tool": spec["tool"]}
+    if "skip" in spec:
+        return {**result, "status": "skipped", "reason": spec["skip"]}
+
+    fn, kwargs = spec["fn"], spec["kwargs"]
+
+    def timed_call() -> Tuple[float, bool]:
+        """Returns the call's duration and whether it raised."""
+        started = time.perf_counter()
+        try:
+            invoke(fn, kwargs)
+            failed = False
+        except Exception:
+            failed = True
+        return time.perf_counter() - started, failed
+
+    try:
+        payload = invoke(fn, kwargs)  # warm-up, also used for the payload size
+    except Exception as e:
+        return {**result, "status": "error", "reason": f"{type(e).__name__}: {e}"}
+
+    sequential = [timed_call() for _ in range(iterations)]
+    latencies = [duration for duration, _ in sequential]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        concurrent = list(pool.map(lambda _: timed_call(), range(sessions * iterations)))
+    elapsed = time.perf_counter() - started
+    errors = sum(failed for _, failed in sequential + concurrent)
+
+    tracemalloc.start()
+    try:
+        invoke(fn, kwargs)
+    except Exception:
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        **result,
+        "status": "ok",
+        "iterations": iterations,
+        "errors": errors,
+        "latency_ms": latency_summary(latencies),
+        "sessions": sessions,
+        "throughput_calls_per_sec": round(sessions * iterations / elapsed, 2),
+        "peak_memory_kib": round(peak / 1024, 1),
+        "payload_bytes": len(json.dumps(payload, default=str)),
+    }
+
+
+MCP_TOOLS = [
+    ("file_manager_agent", "filesystem", "list_directory", {"path": "."}),
+    ("file_manager_agent", "filesystem", "read_file", {"path": "README.MD"}),
+    ("search_agent", "brave-search", "brave_web_search", {"query": "pizza"}),
+    ("web_automation_agent", "puppeteer", "puppeteer_navigate", {"url": "https://example.com"}),
+]
+
+
+def _mcp_is_error(result) -> bool:
+    # mcp 2.x names the field is_error; 1.x used isError.
+    return bool(getattr(result, "is_error", getattr(result, "isError", False)))
+
+
+async def bench_mcp_tool(agent: str, server: str, tool: str, arguments: dict, iterations: int, sessions: int) -> dict:
+    from mcp import ClientSession, StdioServerParameters
+    from mcp.client.stdio import stdio_client
+
+    params = StdioServerParameters(command=sys.executable, args=[STUB_MCP_SERVER, server])
+
+    async def run_session(calls: int) -> Tuple[List[float], int, Optional[str]]:
+        """
+        Returns the call latencies, how many calls the server reported as errors,
+        and the error of the warm-up call (None if it succeeded, then no calls are made).
+        """
+        latencies = []
+        errors = 0
+        async with stdio_client(params) as (read, write):
+            async with ClientSession(read, write) as session:
+                await session.initialize()
+                warm_up = await session.call_tool(tool, arguments)
+                if _mcp_is_error(warm_up):
+                    text = " ".join(getattr(block, "text", "") for block in warm_up.content)
+                    return latencies, errors, text or "the tool call returned an error"
+                for _ in range(calls):
+                    started = time.perf_counter()
+                    result = await session.call_tool(tool, arguments)
+                    latencies.append(time.perf_counter() - started)
+                    errors += _mcp_is_error(result)
+        return latencies, errors, None
+
+    tracemalloc.start()
+    latencies, errors, warm_up_error = await run_session(iterations)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    if warm_up_error is not None:
+        return {"agent": agent, "tool": tool, "status": "error", "reason": warm_up_error}
+
+    started = time.perf_counter()
+    concurrent = await asyncio.gather(*(run_session(iterations) for _ in range(sessions)))
+    elapsed = time.perf_counter() - started
+    errors += sum(session_errors for _, session_errors, _ in concurrent)
+
+    return {
+        "agent": agent,
+        "tool": tool,
+        "status": "ok",
+        "iterations": iterations,
+        "errors": errors,
+        "latency_ms": latency_summary(latencies),
+        "sessions": sessions,
+        # Includes starting one stub server process per session.
+        "throughput_calls_per_sec": round(sessions * iterations / elapsed, 2),
+        # Client side only; the server runs in its own process.
+        "peak_memory_kib": round(peak / 1024, 1),
+    }
+
+
+def compare(results: dict, baseline_path: str, threshold: float) -> List[str]:
+    """Prints per-tool changes against a previous run and returns the regressions."""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {(r["agent"], r["tool"]): r for r in baseline["results"] if r.get("status") == "ok"}
+
+    print(f"\nCompared with {baseline.get('commit') or baseline_path}:")
+    regressions = []
+    for result in results["results"]:
+        old = previous.get((result["agent"], result["tool"]))
+        if result.get("status") != "ok" or old is None:
+            continue
+        p50_change = (result["latency_ms"]["p50"] - old["latency_ms"]["p50"]) / (old["latency_ms"]["p50"] or 1e-9)
+        throughput_change = (
+            (result["throughput_calls_per_sec"] - old["throughput_calls_per_sec"])
+            / (old["throughput_calls_per_sec"] or 1e-9)
+        )
+        name = f"{result['agent']}.{result['tool']}"
+        print(f"  {name:<45} p50 {p50_change:+7.1%}  throughput {throughput_change:+7.1%}")
+        if p50_change > threshold or throughput_change < -threshold:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the agents' tools against local stand-ins.")
+    parser.add_argument("--iterations", type=int, default=20, help="Calls per tool (and per session).")
+    parser.add_argument("--sessions", type=int, default=4, help="Concurrent sessions for the throughput run.")
+    parser.add_argument("--upstream-latency", type=float, default=0.0, help="Milliseconds each fake service waits before answering.")
+    parser.add_argument("--only", help="Comma-separated tool names to run.")
+    parser.add_argument("--skip-mcp", action="store_true", help="Do not start the stub MCP servers.")
+    parser.add_argument("--output", help="Write results as JSON to this path.")
+    parser.add_argument("--compare", help="Previous results JSON to compare against.")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Relative change reported as a regression.")
+    parser.add_argument("--verbose", action="store_true", help="Show the tools' own output.")
+    args = parser.parse_args()
+
+    latency = args.upstream_latency / 1000
+    only = set(args.only.split(",")) if args.only else None
+    services = start_services(latency)
+    results = []
+    workdir = tempfile.mkdtemp(prefix="adk-bench-")
+    cwd = os.getcwd()
+    sys.path.insert(0, ROOT)
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(open(os.devnull, "w"))
+    try:
+        with quiet:
+            specs = load_tools(latency)
+            # save_text_as_pdf writes relative to the working directory.
+            os.chdir(workdir)
+            for spec in specs:
+                if only is None or spec["tool"] in only:
+                    results.append(bench_tool(spec, args.iterations, args.sessions))
+            if not args.skip_mcp:
+                for agent, server, tool, arguments in MCP_TOOLS:
+                    if only is None or tool in only:
+                        results.append(asyncio.run(
+                            bench_mcp_tool(agent, server, tool, arguments, args.iterations, args.sessions)
+                        ))
+    finally:
+        os.chdir(cwd)
+        for service in services.values():
+            service.stop()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "iterations": args.iterations,
+            "sessions": args.sessions,
+            "upstream_latency_ms": args.upstream_latency,
+        },
+        "results": results,
+    }
+
+    from common import instrumentation
+    if instrumentation.ENABLED:
+        report["tool_metrics"] = instrumentation.snapshot()
+
+    print(f"{'tool':<45} {'p50 ms':>9} {'p95 ms':>9} {'calls/s':>10} {'peak KiB':>10}")
+    for result in results:
+        name = f"{result['agent']}.{result['tool']}"
+        if result["status"] != "ok":
+            print(f"{name:<45} {result['status']}: {result['reason']}")
+            continue
+        print(
+            f"{name:<45} {result['latency_ms']['p50']:>9} {result['latency_ms']['p95']:>9} "
+            f"{result['throughput_calls_per_sec']:>10} {result['peak_memory_kib']:>10}"
+            + (f"  ({result['errors']} errors)" if result["errors"] else "")
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        regressions = compare(report, args.compare, args.threshold)
+        if regressions:
+            print(f"\nRegressed beyond {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Stub MCP servers standing in for the npx servers used by the MCP agents.
+
+Usage: python stub_mcp_server.py filesystem|brave-search|puppeteer
+
+Each flavour exposes the tool names the real server does, answering over
+stdio with canned content and no network or browser access.
+"""
+import sys
+
+try:
+    from mcp.server.mcpserver import MCPServer
+except ImportError:  # mcp < 2
+    from mcp.server.fastmcp import FastMCP as MCPServer
+
+FILE_CONTENT = "Benchmark file line.\n" * 500
+
+
+def filesystem_server() -> MCPServer:
+    server = MCPServer("stub-filesystem")
+
+    @server.tool()
+    def list_directory(path: str) -> str:
+        return "\n".join(f"[FILE] file{i}.txt" for i in range(100))
+
+    @server.tool()
+    def read_file(path: str) -> str:
+        return FILE_CONTENT
+
+    return server
+
+
+def brave_search_server() -> MCPServer:
+    server = MCPServer("stub-brave-search")
+
+    @server.tool()
+    def brave_web_search(query: str, count: int = 10) -> str:
+        return "\n\n".join(
+            f"Title: {query} result {i}\nDescription: Benchmark description {i}.\nURL: https://example.com/{i}"
+            for i in range(count)
+        )
+
+    return server
+
+
+def puppeteer_server() -> MCPServer:
+    server = MCPServer("stub-puppeteer")
+
+    @server.tool()
+    def puppeteer_navigate(url: str) -> str:
+        return f"Navigated to {url}"
+
+    @server.tool()
+    def puppeteer_evaluate(script: str) -> str:
+        return "Execution result:\n\"Benchmark page title\""
+
+    return server
+
+
+SERVERS = {
+    "filesystem": filesystem_server,
+    "brave-search": brave_search_server,
+    "puppeteer": puppeteer_server,
+}
+
+
+if __name__ == "__main__":
+    SERVERS[sys.argv[1]]().run()
@@ -0,0 +1,358 @@
+"""
+Per-tool latency and I/O metrics.
+
+Set TOOL_METRICS=1 to enable. Every tool decorated with `instrument` then
+records its wall time, result size and errors, and every upstream call made
+inside `upstream(...)` records its count and latency. Metrics are kept as
+in-process histograms/counters (`snapshot()`), rendered in the Prometheus
+text format (`render_prometheus()`, served on /metrics when
+TOOL_METRICS_PORT is set), and optionally emitted as OpenTelemetry spans
+(TOOL_METRICS_OTEL=1, requires opentelemetry-api).
+
+When TOOL_METRICS is unset `instrument` returns the tool unchanged and
+`upstream` returns a shared no-op context manager.
+"""
+import bisect
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+ENABLED = _env_flag("TOOL_METRICS")
+
+_tracer = None
+if ENABLED and _env_flag("TOOL_METRICS_OTEL"):
+    try:
+        from opentelemetry import trace
+
+        _tracer = trace.get_tracer("intro-to-adk.tools")
+    except ImportError:
+        print("--- TOOL_METRICS_OTEL is set but opentelemetry-api is not installed; spans disabled ---")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as used by Prometheus."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Thread-safe store of the histograms and counters, keyed by name and labels."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+
+    def observe(self, name: str, labels: Dict[str, str], value: float, buckets: Tuple[float, ...]):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, labels: Dict[str, str], amount: float = 1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self) -> dict:
+        """Returns a JSON-serializable copy of every metric."""
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "histograms": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": histogram.count,
+                        "sum": histogram.sum,
+                        "buckets": dict(zip([*map(str, histogram.buckets), "+Inf"], histogram.counts)),
+                    }
+                    for (name, labels), histogram in sorted(self._histograms.items())
+                ],
+            }
+
+    def render_prometheus(self) -> str:
+        """Renders every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+            for name in sorted({name for name, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (metric, labels), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip([*map(_format_bound, histogram.buckets), "+Inf"], histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_bound(bound: float) -> str:
+    return f"{bound:g}"
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels:
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+REGISTRY = Registry()
+
+# Name of the tool currently running, so upstream calls are attributed to it.
+_current_tool: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_tool", default=None)
+
+
+def _span(name: str, attributes: Dict[str, str]):
+    if _tracer is None:
+        return None
+    span = _tracer.start_as_current_span(name, attributes=attributes)
+    span.__enter__()
+    return span
+
+
+def _end_span(span, error: Optional[BaseException]):
+    """Closes a tool span, passing on the exception so the span records the failure."""
+    if span is None:
+        return
+    if error is None:
+        span.__exit__(None, None, None)
+    else:
+        span.__exit__(type(error), error, error.__traceback__)
+
+
+def _payload_size(result) -> int:
+    if isinstance(result, (bytes, str)):
+        return len(result)
+    try:
+        return len(json.dumps(result, default=str))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _record_call(tool: str, started: float, result=None, error: Optional[BaseException] = None):
+    labels = {"tool": tool}
+    REGISTRY.observe("tool_call_duration_seconds", labels, time.perf_counter() - started, LATENCY_BUCKETS)
+    if error is not None:
+        status = "error"
+        REGISTRY.inc("tool_errors_total", {**labels, "error": type(error).__name__})
+    else:
+        # Tools report most failures as {"status": "error", ...} rather than raising.
+        status = "error" if isinstance(result, dict) and result.get("status") == "error" else "ok"
+        REGISTRY.observe("tool_response_bytes", labels, _payload_size(result), SIZE_BUCKETS)
+    REGISTRY.inc("tool_calls_total", {**labels, "status": status})
+
+
+def instrument(fn: Callable) -> Callable:
+    """
+    Decorator recording wall time, result size and errors of a tool call.
+
+    The wrapper keeps the tool's name, docstring and signature, so ADK builds
+    the same function declaration as for the undecorated tool.
+
+    A tool called from inside another tool is not recorded as a call of its
+    own; its upstream requests are attributed to the outer tool.
+    """
+    if not ENABLED:
+        return fn
+
+    tool = fn.__name__
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            if _current_tool.get() is not None:
+                return await fn(*args, **kwargs)
+            token = _current_tool.set(tool)
+            span = _span(f"tool {tool}", {"tool.name": tool})
+            started = time.perf_counter()
+            error = None
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception as e:
+                error = e
+                _record_call(tool, started, error=e)
+                raise
+            finally:
+                _current_tool.reset(token)
+                _end_span(span, error)
+            _record_call(tool, started, result)
+            return result
+
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _current_tool.get() is not None:
+            return fn(*args, **kwargs)
+        token = _current_tool.set(tool)
+        span = _span(f"tool {tool}", {"tool.name": tool})
+        started = time.perf_counter()
+        error = None
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            error = e
+            _record_call(tool, started, error=e)
+            raise
+        finally:
+            _current_tool.reset(token)
+            _end_span(span, error)
+        _record_call(tool, started, result)
+        return result
+
+    return wrapper
+
+
+class _Upstream:
+    """Times one request to an upstream service made by the current tool."""
+
+    __slots__ = ("service", "started", "span")
+
+    def __init__(self, service: str):
+        self.service = service
+
+    def __enter__(self):
+        self.span = _span(f"upstream {self.service}", {"upstream.service": self.service})
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        labels = {"tool": _current_tool.get() or "", "service": self.service}
+        REGISTRY.observe("tool_upstream_duration_seconds", labels, time.perf_counter() - self.started, LATENCY_BUCKETS)
+        REGISTRY.inc("tool_upstream_requests_total", {**labels, "status": "error" if exc_type else "ok"})
+        if self.span is not None:
+            self.span.__exit__(exc_type, exc, tb)
+        return False
+
+
+class _NoopUpstream:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_UPSTREAM = _NoopUpstream()
+
+
+def upstream(service: str):
+    """
+    Context manager wrapping one request to an external service.
+
+    Usage:
+        with upstream("weatherapi"):
+            response = requests.get(...)
+    """
+    if not ENABLED:
+        return _NOOP_UPSTREAM
+    return _Upstream(service)
+
+
+def count(name: str, **labels: str):
+    """Increments a counter, attributed to the current tool."""
+    if not ENABLED:
+        return
+    REGISTRY.inc(name, {"tool": _current_tool.get() or "", **labels})
+
+
+def record_cache(cache: str, hit: bool):
+    """Counts a cache lookup made by the current tool."""
+    count("tool_cache_hits_total" if hit else "tool_cache_misses_total", cache=cache)
+
+
+def snapshot() -> dict:
+    return REGISTRY.snapshot()
+
+
+def render_prometheus() -> str:
+    return REGISTRY.render_prometheus()
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serves /metrics in the Prometheus text format from a background thread (once per process)."""
+    global _server
+    with _server_lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, daemon=True).start()
+            print(f"--- Tool metrics served on http://{host}:{port}/metrics ---")
+    return _server
+
+
+if ENABLED and os.getenv("TOOL_METRICS_PORT"):
+    start_metrics_server(int(os.environ["TOOL_METRICS_PORT"]))
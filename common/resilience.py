@@ -0,0 +1,359 @@
+"""
+Process-wide rate limiting, retries and circuit breaking for upstream APIs.
+
+Every request to an external service goes through `call_upstream(service,
+fn, ...)` (or `call_upstream_async` from async tools), which:
+
+1. fails fast with `CircuitOpenError` while the service's circuit is open,
+2. waits for a token from the service's token bucket, so concurrent sessions
+   share one request budget per service instead of stampeding the API, or
+   fails with `RateLimitError` if the wait would exceed MAX_WAIT_SECONDS,
+3. calls `fn` inside `instrumentation.upstream(service)`, and
+4. retries rate-limit (429, Gmail rateLimitExceeded), 5xx and network errors
+   with jittered exponential backoff, waiting for Retry-After when the
+   service sends one.
+
+`call_upstream` waits with time.sleep, so tools on the event loop must use
+`call_upstream_async`, which waits with asyncio.sleep and runs only `fn`
+itself in a worker thread.
+
+Limits default to SERVICE_LIMITS and can be overridden per service with
+UPSTREAM_RATE_<SERVICE> (requests per second) and UPSTREAM_BURST_<SERVICE>.
+"""
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+from dotenv import load_dotenv
+
+from .instrumentation import count, upstream
+
+load_dotenv()
+
+try:
+    import prawcore
+except ImportError:  # only installed with multi_tool_agent's dependencies
+    prawcore = None
+
+try:
+    import googlemaps.exceptions as googlemaps_exceptions
+except ImportError:  # only installed with gsuite's dependencies
+    googlemaps_exceptions = None
+
+# service: (requests per second, burst)
+SERVICE_LIMITS: Dict[str, Tuple[float, int]] = {
+    "weatherapi": (10.0, 10),
+    "gemini": (2.0, 5),
+    "elevenlabs": (2.0, 2),
+    "reddit": (1.5, 10),  # Reddit allows 100 OAuth requests per minute
+    "drive": (10.0, 20),
+    "gmail": (10.0, 20),
+    "maps": (20.0, 20),
+}
+DEFAULT_LIMIT = (5.0, 5)
+
+MAX_ATTEMPTS = int(os.getenv("UPSTREAM_MAX_ATTEMPTS", "4"))
+BASE_DELAY_SECONDS = 0.5
+MAX_DELAY_SECONDS = 20.0
+# Longest a call waits for a rate-limit token or a Retry-After pause.
+MAX_WAIT_SECONDS = 60.0
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT_SECONDS = 30.0
+
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class UpstreamUnavailableError(Exception):
+    """Base for errors raised instead of calling a service."""
+
+
+class CircuitOpenError(UpstreamUnavailableError):
+    """Raised instead of calling a service whose circuit breaker is open."""
+
+    def __init__(self, service: str, retry_in: float):
+        super().__init__(f"{service} is temporarily unavailable after repeated failures; retry in {retry_in:.0f}s.")
+        self.service = service
+        self.retry_in = retry_in
+
+
+class RateLimitError(UpstreamUnavailableError):
+    """Raised when a call would wait longer than MAX_WAIT_SECONDS for its service's rate limit."""
+
+    def __init__(self, service: str):
+        super().__init__(f"Too many requests to {service} are queued; try again shortly.")
+        self.service = service
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled at `rate` tokens per second, holding up to `burst`."""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, max_wait: float) -> Optional[float]:
+        """
+        Takes a token, returning how long the caller must wait before using it,
+        or None (without taking a token) if that would be longer than `max_wait`.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # A negative balance is a queue of callers; each waits for its own token.
+            wait = 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if wait > max_wait:
+                return None
+            self._tokens -= 1
+            return wait
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `reset_timeout` seconds, then lets a single trial call through (half-open).
+    """
+
+    def __init__(self, failure_threshold: int = FAILURE_THRESHOLD, reset_timeout: float = RESET_TIMEOUT_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self, service: str):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            elapsed = time.monotonic() - self._opened_at
+            if elapsed < self.reset_timeout or self._trial_running:
+                raise CircuitOpenError(service, max(self.reset_timeout - elapsed, 0))
+            self._trial_running = True
+
+    def release_trial(self):
+        """Gives up a half-open trial that was let through but not made."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self) -> bool:
+        """Counts a failure; returns True if this opened the circuit."""
+        with self._lock:
+            self._failures += 1
+            reopened = self._trial_running
+            self._trial_running = False
+            if reopened or (self._opened_at is None and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                return True
+            return False
+
+
+_limiters: Dict[str, TokenBucket] = {}
+_breakers: Dict[str, CircuitBreaker] = {}
+_registry_lock = threading.Lock()
+
+
+def _service_limit(service: str) -> Tuple[float, int]:
+    rate, burst = SERVICE_LIMITS.get(service, DEFAULT_LIMIT)
+    key = service.upper().replace("-", "_")
+    rate = float(os.getenv(f"UPSTREAM_RATE_{key}", rate))
+    burst = int(os.getenv(f"UPSTREAM_BURST_{key}", burst))
+    return rate, burst
+
+
+def limiter_for(service: str) -> TokenBucket:
+    with _registry_lock:
+        if service not in _limiters:
+            _limiters[service] = TokenBucket(*_service_limit(service))
+        return _limiters[service]
+
+
+def breaker_for(service: str) -> CircuitBreaker:
+    with _registry_lock:
+        if service not in _breakers:
+            _breakers[service] = CircuitBreaker()
+        return _breakers[service]
+
+
+def _parse_retry_after(value: Any) -> Optional[float]:
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(str(value))
+    except (TypeError, ValueError):
+        return None
+    return max(retry_at.timestamp() - time.time(), 0.0)
+
+
+def classify_error(exc: BaseException) -> Tuple[bool, bool, Optional[float]]:
+    """
+    Decides how to handle an upstream error.
+
+    Works with the errors raised by requests, prawcore, googleapiclient,
+    googlemaps and elevenlabs without depending on them.
+
+    Returns:
+        tuple: (retryable, counts against the circuit breaker, Retry-After seconds or None)
+    """
+    if isinstance(exc, (requests.ConnectionError, requests.Timeout, ConnectionError, TimeoutError)):
+        return True, True, None
+    if prawcore is not None and isinstance(exc, prawcore.exceptions.RequestException):
+        return True, True, None
+    if googlemaps_exceptions is not None:
+        if isinstance(exc, (googlemaps_exceptions.Timeout, googlemaps_exceptions._OverQueryLimit)):
+            return True, False, None
+        if isinstance(exc, googlemaps_exceptions.TransportError) and not isinstance(exc, googlemaps_exceptions.HTTPError):
+            return True, True, None
+
+    # requests / prawcore keep the HTTP response on .response; googleapiclient on .resp.
+    response = getattr(exc, "response", None)
+    if response is None:
+        response = getattr(exc, "resp", None)
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(response, "status_code", None) or getattr(response, "status", None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False, False, None
+
+    headers = getattr(exc, "headers", None) or getattr(response, "headers", None)
+    if headers is None and isinstance(response, dict):
+        headers = response  # httplib2.Response is a dict of lower-cased headers
+    headers = headers or {}
+    retry_after = _parse_retry_after(headers.get("retry-after") or headers.get("Retry-After"))
+
+    if status == 403:
+        # Gmail / Drive report per-user quota as 403 rateLimitExceeded / userRateLimitExceeded.
+        content = getattr(exc, "content", b"") or b""
+        if isinstance(content, bytes):
+            content = content.decode("utf-8", errors="ignore")
+        if "ratelimitexceeded" in str(content).lower():
+            return True, False, retry_after
+        return False, False, None
+    if status in RETRYABLE_STATUS:
+        return True, status >= 500, retry_after
+    return False, False, None
+
+
+def backoff_delay(attempt: int, base: float = BASE_DELAY_SECONDS, cap: float = MAX_DELAY_SECONDS) -> float:
+    """Full-jitter exponential backoff for the given (0-based) retry attempt."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _admit(service: str, breaker: CircuitBreaker, limiter: TokenBucket) -> float:
+    """
+    Lets one request to `service` through the circuit breaker and takes its
+    rate-limit token, returning how long to wait before sending it.
+    """
+    try:
+        breaker.before_call(service)
+    except CircuitOpenError:
+        count("tool_upstream_rejected_total", service=service, reason="circuit_open")
+        raise
+    wait = limiter.reserve(MAX_WAIT_SECONDS)
+    if wait is None:
+        # A trial call let through by a half-open circuit was not made.
+        breaker.release_trial()
+        count("tool_upstream_rejected_total", service=service, reason="rate_limited")
+        raise RateLimitError(service)
+    return wait
+
+
+def _retry_delay(service: str, breaker: CircuitBreaker, error: Exception, attempt: int) -> Optional[float]:
+    """Records a failed request; returns the delay before retrying it, or None to give up."""
+    retryable, is_failure, retry_after = classify_error(error)
+    if is_failure and breaker.record_failure():
+        print(f"--- Upstream {service}: circuit opened after repeated failures ---")
+        return None
+    if not is_failure:
+        # Rate limiting and client errors say nothing about the service being up or
+        # down: they leave the failure count alone and only free a half-open trial.
+        breaker.release_trial()
+    if not retryable or attempt == MAX_ATTEMPTS - 1:
+        return None
+    delay = retry_after if retry_after is not None else backoff_delay(attempt)
+    if delay > MAX_WAIT_SECONDS:
+        # The service asked for a longer pause than a tool call should block for.
+        return None
+    count("tool_upstream_retries_total", service=service)
+    print(f"--- Upstream {service}: {type(error).__name__}, retrying in {delay:.2f}s ---")
+    return delay
+
+
+def call_upstream(service: str, fn: Callable, *args, **kwargs):
+    """
+    Calls `fn(*args, **kwargs)` as one request to `service`, with rate limiting,
+    retries and circuit breaking. `fn` must be safe to call again on failure.
+
+    This blocks while waiting for the rate limit or a retry; from async code
+    use `call_upstream_async`.
+
+    Raises:
+        CircuitOpenError: If the service's circuit is open.
+        RateLimitError: If the service's rate limit queue is longer than MAX_WAIT_SECONDS.
+        Exception: The last error from `fn` once it is not retryable or the
+            attempts (UPSTREAM_MAX_ATTEMPTS) are used up.
+    """
+    limiter = limiter_for(service)
+    breaker = breaker_for(service)
+
+    for attempt in range(MAX_ATTEMPTS):
+        wait = _admit(service, breaker, limiter)
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            with upstream(service):
+                result = fn(*args, **kwargs)
+        except Exception as e:
+            delay = _retry_delay(service, breaker, e, attempt)
+            if delay is None:
+                raise
+            time.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
+
+
+async def call_upstream_async(service: str, fn: Callable, *args, **kwargs):
+    """
+    `call_upstream` for async tools. Rate-limit and retry waits are asyncio
+    sleeps, and only the blocking `fn` call runs in a worker thread, so a
+    queue of waiting requests for one service holds no threads.
+    """
+    limiter = limiter_for(service)
+    breaker = breaker_for(service)
+
+    for attempt in range(MAX_ATTEMPTS):
+        wait = _admit(service, breaker, limiter)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        try:
+            with upstream(service):
+                result = await asyncio.to_thread(fn, *args, **kwargs)
+        except Exception as e:
+            delay = _retry_delay(service, breaker, e, attempt)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
+            continue
+        breaker.record_success()
+        return result
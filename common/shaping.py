@@ -0,0 +1,270 @@
+"""
+Keeps tool results within a size budget before they reach the model context.
+
+- `project` keeps only the requested fields of a record.
+- `shape_items` and `shape_text` cut a result down to the budget and park the
+  rest in a process-wide store under a continuation handle, which the
+  `get_more_results` tool pages through.
+- Tools whose upstream API paginates natively (Gmail, Drive) return that
+  API's page token as `nextCursor` instead.
+
+The budget defaults to TOOL_RESULT_MAX_TOKENS (2000) tokens, estimated at 4
+bytes per token, or TOOL_RESULT_MAX_BYTES when set. At most
+CONTINUATION_MAX_PAGES budgets' worth of the rest is kept; anything beyond
+that is reported as omitted rather than stored.
+"""
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Union
+
+from dotenv import load_dotenv
+
+from .instrumentation import instrument, record_cache
+
+load_dotenv()
+
+BYTES_PER_TOKEN = 4
+DEFAULT_MAX_BYTES = int(
+    os.getenv("TOOL_RESULT_MAX_BYTES")
+    or int(os.getenv("TOOL_RESULT_MAX_TOKENS", "2000")) * BYTES_PER_TOKEN
+)
+CONTINUATION_TTL_SECONDS = 30 * 60
+CONTINUATION_MAX_ENTRIES = 256
+CONTINUATION_MAX_BYTES = 32 * 1024 * 1024
+# How many further pages of a cut result are kept for get_more_results.
+CONTINUATION_MAX_PAGES = 20
+
+TRUNCATION_MARKER = "... [truncated]"
+
+
+def _size(value: Any) -> int:
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return len(json.dumps(value, default=str).encode("utf-8"))
+
+
+def parse_fields(fields: Union[str, Iterable[str], None]) -> Optional[List[str]]:
+    """Accepts fields as "a,b,c" (the form models pass) or a list; empty means all fields."""
+    if not fields:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    parsed = [field.strip() for field in fields if field.strip()]
+    return parsed or None
+
+
+def project(record: Dict[str, Any], fields: Union[str, Iterable[str], None]) -> Dict[str, Any]:
+    """Returns only the requested fields of `record` (all of them if `fields` is empty)."""
+    fields = parse_fields(fields)
+    if fields is None:
+        return record
+    return {field: record[field] for field in fields if field in record}
+
+
+class ContinuationStore:
+    """
+    Bounded in-memory store for the parts of results that did not fit the budget.
+
+    Entries expire after `ttl` seconds, and the least recently added entries
+    are evicted once `max_entries` or `max_bytes` is exceeded. The entry being
+    added is never evicted; entries larger than `max_bytes` are refused.
+    """
+
+    def __init__(self, ttl: float = CONTINUATION_TTL_SECONDS, max_entries: int = CONTINUATION_MAX_ENTRIES,
+                 max_bytes: int = CONTINUATION_MAX_BYTES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, entry: Dict[str, Any]) -> str:
+        handle = secrets.token_urlsafe(9)
+        size = _size(entry["data"])
+        if size > self.max_bytes:
+            raise ValueError(f"Continuation of {size} bytes exceeds the store limit of {self.max_bytes} bytes")
+        with self._lock:
+            self._entries[handle] = (time.monotonic() + self.ttl, size, entry)
+            self._bytes += size
+            while len(self._entries) > 1 and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+        return handle
+
+    def pop(self, handle: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            item = self._entries.pop(handle, None)
+            if item is None:
+                return None
+            expires, size, entry = item
+            self._bytes -= size
+        return entry if expires > time.monotonic() else None
+
+
+CONTINUATIONS = ContinuationStore()
+
+
+def _fit_item(item: Dict[str, Any], max_bytes: int) -> Dict[str, Any]:
+    """Shortens the longest string fields of a single item until it fits."""
+    item = dict(item)
+    while _size(item) > max_bytes:
+        longest = max(
+            (key for key, value in item.items() if isinstance(value, str)),
+            key=lambda key: len(item[key]),
+            default=None,
+        )
+        if longest is None or len(item[longest]) <= 2 * len(TRUNCATION_MARKER):
+            break
+        value = item[longest]
+        if value.endswith(TRUNCATION_MARKER):
+            value = value[:-len(TRUNCATION_MARKER)]
+        item[longest] = value[:len(value) // 2] + TRUNCATION_MARKER
+    return item
+
+
+def _continuation_limit(max_bytes: int) -> int:
+    """Bytes of a cut result kept for get_more_results."""
+    return min(CONTINUATION_MAX_PAGES * max_bytes, CONTINUATIONS.max_bytes)
+
+
+def _note_omitted(result: Dict[str, Any], omitted: int, unit: str) -> Dict[str, Any]:
+    if omitted:
+        result[f"omitted_{unit}"] = omitted
+        result["note"] = (
+            f"The result was too large to keep in full; the last {omitted} {'characters' if unit == 'chars' else unit} "
+            "cannot be fetched with get_more_results."
+        )
+    return result
+
+
+def shape_items(items: List[Dict[str, Any]], key: str = "items", fields: Union[str, Iterable[str], None] = None,
+                max_bytes: Optional[int] = None, omitted: int = 0) -> Dict[str, Any]:
+    """
+    Projects `items` to `fields` and keeps as many as fit in `max_bytes`.
+
+    Args:
+        items: The records to return.
+        key: Name of the list in the returned dictionary.
+        fields: Fields to keep on each record ("a,b,c" or a list); empty keeps all.
+        max_bytes: Budget for the serialized result. Defaults to DEFAULT_MAX_BYTES.
+        omitted: Items already dropped from the end of the original result.
+
+    Returns:
+        dict: {key: [...]} and, when items were left out, "truncated": True,
+        "remaining" (how many) and the "continuation" handle for get_more_results.
+        Items beyond what can be kept for later are counted in "omitted_items".
+    """
+    max_bytes = max_bytes or DEFAULT_MAX_BYTES
+    fields = parse_fields(fields)
+    kept = []
+    used = _size({key: []})
+    for index, item in enumerate(items):
+        item = project(item, fields)
+        size = _size(item) + 2
+        if used + size > max_bytes:
+            if kept:
+                rest = items[index:]
+                stored = _items_within(rest, _continuation_limit(max_bytes))
+                omitted += len(rest) - len(stored)
+                result = {key: kept, "truncated": True, "remaining": len(stored)}
+                if stored:
+                    result["continuation"] = CONTINUATIONS.put({
+                        "kind": "items", "data": stored, "key": key, "fields": fields,
+                        "max_bytes": max_bytes, "omitted": omitted,
+                    })
+                return _note_omitted(result, omitted, "items")
+            item = _fit_item(item, max_bytes - used)
+            size = _size(item) + 2
+        kept.append(item)
+        used += size
+    return _note_omitted({key: kept}, omitted, "items")
+
+
+def _items_within(items: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """The leading items whose serialized size fits in `limit` bytes."""
+    used = 0
+    for index, item in enumerate(items):
+        used += _size(item) + 2
+        if used > limit:
+            return items[:index]
+    return items
+
+
+def _text_within(text: str, limit: int) -> str:
+    """The head of `text` that fits in `limit` bytes of UTF-8."""
+    # A character is at least one byte, so the first `limit` characters are enough to cut from.
+    return text[:limit].encode("utf-8")[:limit].decode("utf-8", errors="ignore")
+
+
+def _cut_point(text: str, limit: int) -> int:
+    """Index to cut `text` at, preferring a line or word break just before `limit`."""
+    if len(text) <= limit:
+        return len(text)
+    floor = int(limit * 0.8)
+    for separator in ("\n", " "):
+        index = text.rfind(separator, floor, limit)
+        if index > 0:
+            return index + 1
+    return limit
+
+
+def shape_text(text: str, key: str = "content", max_bytes: Optional[int] = None, omitted: int = 0) -> Dict[str, Any]:
+    """
+    Returns the head of `text` that fits in `max_bytes`.
+
+    Returns:
+        dict: {key: text} and, when the text was cut, "truncated": True,
+        "remaining_chars" and the "continuation" handle for get_more_results.
+        Characters beyond what can be kept for later are counted in "omitted_chars".
+    """
+    max_bytes = max_bytes or DEFAULT_MAX_BYTES
+    if _size(text) <= max_bytes:
+        return _note_omitted({key: text}, omitted, "chars")
+    # Characters can be several bytes; count from the encoded text so the head fits.
+    limit = len(_text_within(text, max_bytes))
+    cut = _cut_point(text, limit)
+    rest = text[cut:]
+    stored = _text_within(rest, _continuation_limit(max_bytes))
+    omitted += len(rest) - len(stored)
+    result = {
+        key: text[:cut],
+        "truncated": True,
+        "remaining_chars": len(stored),
+        "continuation": CONTINUATIONS.put(
+            {"kind": "text", "data": stored, "key": key, "max_bytes": max_bytes, "omitted": omitted}
+        ),
+    }
+    return _note_omitted(result, omitted, "chars")
+
+
+@instrument
+def get_more_results(continuation: str) -> dict:
+    """
+    Fetches the next part of a tool result that was cut short.
+
+    Use this when a tool result has "truncated": true and you need more of it.
+
+    Args:
+        continuation: The "continuation" value from the truncated result.
+
+    Returns:
+        dict: The next part in the same shape as the original result, with a
+              new "continuation" value if there is still more.
+    """
+    entry = CONTINUATIONS.pop(continuation)
+    record_cache("continuations", hit=entry is not None)
+    if entry is None:
+        return {
+            "status": "error",
+            "error_message": "This continuation has expired or was already used. Call the original tool again.",
+        }
+    if entry["kind"] == "text":
+        return shape_text(entry["data"], key=entry["key"], max_bytes=entry["max_bytes"], omitted=entry["omitted"])
+    return shape_items(
+        entry["data"], key=entry["key"], fields=entry["fields"], max_bytes=entry["max_bytes"], omitted=entry["omitted"]
+    )
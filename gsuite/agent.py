@@ -7,7 +7,6 @@ from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from google_auth_oauthlib.flow import InstalledAppFlow
 
-import asyncio
 from email.message import EmailMessage
 from email import message_from_bytes
 
@@ -17,6 +16,10 @@ from base64 import urlsafe_b64decode
 import googlemaps
 from datetime import datetime
 
+from common.instrumentation import instrument
+from common.resilience import call_upstream_async
+from common.shaping import DEFAULT_MAX_BYTES, get_more_results, project, shape_text
+
 
 KEYFILE_PATH = os.getcwd() + "/gsuite/credentials/gcp-oauth.keys.json"
 GDRIVE_CREDENTIALS_PATH = os.getcwd() + "/gsuite/credentials/.gdrive-server-credentials.json"
@@ -24,6 +27,9 @@ GMAIL_CREDENTIALS_PATH = os.getcwd() + "/gsuite/credentials/.gmail-server-creden
 DRIVE_SCOPES = ["https://www.googleapis.com/auth/drive.readonly"]
 GMAIL_SCOPES = ["https://www.googleapis.com/auth/gmail.modify"]
 PORT = 8080
+# A listed message is about 30 bytes of JSON ({"id": "<16 hex chars>"}), so a page
+# of this many fits the tool result budget and is never cut short.
+MAX_EMAIL_PAGE_SIZE = max(1, min(500, DEFAULT_MAX_BYTES // 32))
 
 def authenticate_and_save(app: str = "drive"):
     
@@ -54,7 +60,8 @@ def get_drive_client():
     creds = Credentials.from_authorized_user_file(GDRIVE_CREDENTIALS_PATH, DRIVE_SCOPES)
     return build("drive", "v3", credentials=creds)
 
-def list_drive_files(page_size: int = 10, cursor: str = "", query: str = "") -> dict:
+@instrument
+async def list_drive_files(page_size: int = 10, cursor: str = "", query: str = "") -> dict:
     """List files in Google Drive.
     Args:
         cursor (string): Page token for pagination, which can be None.
@@ -72,13 +79,21 @@ def list_drive_files(page_size: int = 10, cursor: str = "", query: str = "") ->
     params = {"pageSize": page_size, "fields": "nextPageToken, files(id, name, mimeType)", "q": query}
     if cursor:
         params["pageToken"] = cursor
-    resp = drive.files().list(**params).execute()
+    resp = await call_upstream_async("drive", drive.files().list(**params).execute)
     files = resp.get("files", [])
     return {"resources": [{"uri": f"gdrive:///{f['id']}", "mimeType": f["mimeType"], "name": f["name"]} for f in files], "nextCursor": resp.get("nextPageToken")}
 
-def read_drive_file(file_id: str):
+@instrument
+async def read_drive_file(file_id: str):
+    """Read a file from Google Drive.
+    Args:
+        file_id (str): ID of the file (the part after gdrive:/// in its uri).
+    Returns:
+        dict: The file's mimeType and content. Long files are cut to the result budget;
+              then 'truncated' is true and 'continuation' can be passed to get_more_results.
+    """
     drive = get_drive_client()
-    meta = drive.files().get(fileId=file_id, fields="mimeType").execute()
+    meta = await call_upstream_async("drive", drive.files().get(fileId=file_id, fields="mimeType").execute)
     mime = meta.get("mimeType", "")
     if mime.startswith("application/vnd.google-apps"):
         exports = {
@@ -87,15 +102,15 @@ def read_drive_file(file_id: str):
             "application/vnd.google-apps.presentation": "text/plain",
             "application/vnd.google-apps.drawing": "image/png",
         }
-        out_type = exports.get(mime, "text/plain")
-        data = drive.files().export(fileId=file_id, mimeType=out_type).execute()
-        return {"mimeType": out_type, "content": data}
-    resp = drive.files().get_media(fileId=file_id).execute()
+        mime = exports.get(mime, "text/plain")
+        data = await call_upstream_async("drive", drive.files().export(fileId=file_id, mimeType=mime).execute)
+    else:
+        data = await call_upstream_async("drive", drive.files().get_media(fileId=file_id).execute)
     if mime.startswith("text/") or mime == "application/json":
-        text = resp.decode("utf-8")
+        text = data.decode("utf-8", errors="replace")
     else:
-        text = resp.encode("base64")
-    return {"mimeType": mime, "content": text}
+        text = base64.b64encode(data).decode()
+    return {"mimeType": mime, **shape_text(text)}
 
 
 # -- Gmail Client --
@@ -104,10 +119,11 @@ def get_gmail_client():
     creds = Credentials.from_authorized_user_file(GMAIL_CREDENTIALS_PATH, GMAIL_SCOPES)
     return build("gmail", "v1", credentials=creds)
 
-def get_current_user_email_id():
+@instrument
+async def get_current_user_email_id():
     """Get current user's email address"""
     client = get_gmail_client()
-    profile = client.users().getProfile(userId='me').execute()
+    profile = await call_upstream_async("gmail", client.users().getProfile(userId='me').execute)
     emailId = profile.get("emailAddress", "")
 
     return {
@@ -116,6 +132,7 @@ def get_current_user_email_id():
         }
     }
 
+@instrument
 async def send_email(sender_id: str, recipient_id: str, subject: str, message: str,) -> dict:
     """Creates and sends an email message"""
     client = get_gmail_client()
@@ -129,39 +146,38 @@ async def send_email(sender_id: str, recipient_id: str, subject: str, message: s
     encoded_message = base64.urlsafe_b64encode(message_obj.as_bytes()).decode()
     create_message = {'raw': encoded_message}
     
-    send_message = await asyncio.to_thread( 
-        client.users().messages().send(userId="me", body=create_message).execute
+    send_message = await call_upstream_async(
+        "gmail", client.users().messages().send(userId="me", body=create_message).execute
     )
     return {"status": "success", "message_id": send_message["id"]}
 
-async def get_emails(type: str = "unread"):
+@instrument
+async def get_emails(type: str = "unread", page_size: int = 20, cursor: str = ""):
         """
-        Fetch messages from mailbox.
-        Returns list of messsage IDs in as 'message_id'.
+        Fetch one page of messages from mailbox.
+        Returns the message IDs in 'messages' (each as 'id'). If there are more,
+        'nextCursor' is set; pass it as `cursor` to get the next page.
         """
         client = get_gmail_client()
 
         user_id = 'me'
         query = f'in:inbox is:{type} category:primary'
+        params = {"userId": user_id, "q": query, "maxResults": max(1, min(page_size, MAX_EMAIL_PAGE_SIZE))}
+        if cursor:
+            params["pageToken"] = cursor
 
-        response = client.users().messages().list(userId=user_id, q=query).execute()
-        messages = []
-        if 'messages' in response:
-            messages.extend(response['messages'])
-
-        while 'nextPageToken' in response:
-            page_token = response['nextPageToken']
-            response = client.users().messages().list(userId=user_id, q=query, pageToken=page_token).execute()
-            messages.extend(response['messages'])
-        return messages
+        response = await call_upstream_async("gmail", client.users().messages().list(**params).execute)
+        messages = response.get('messages', [])
+        return {"messages": [project(message, "id") for message in messages], "nextCursor": response.get('nextPageToken')}
 
 
+@instrument
 async def read_email_content(email_id: str) -> dict[str, str]| str:
     """Retrieves email contents including to, from, subject, and contents."""
 
     client = get_gmail_client()
 
-    msg = client.users().messages().get(userId="me", id=email_id, format='raw').execute()
+    msg = await call_upstream_async("gmail", client.users().messages().get(userId="me", id=email_id, format='raw').execute)
     email_data = {}
 
     raw_data = msg['raw']
@@ -190,19 +206,21 @@ async def read_email_content(email_id: str) -> dict[str, str]| str:
 
     return email_data
     
+@instrument
 async def delete_email(message_id: str) -> str:
     """Moves email to trash given ID."""
     client = get_gmail_client()
-    client.users().messages().trash(userId="me", id=message_id).execute()
+    await call_upstream_async("gmail", client.users().messages().trash(userId="me", id=message_id).execute)
     return "Email deleted successfully."
 
 # -- Google Maps Client --
 gmaps = googlemaps.Client(key=os.environ['GOOGLE_MAPS_API_KEY'])
 
+@instrument
 async def get_directions(origin: str, destination: str, mode: str = "driving") -> str:
     """Get directions between two locations. Make sure to convert response to human readable format."""
     now = datetime.now()
-    directions_result = gmaps.directions(origin, destination, mode=mode, departure_time=now)
+    directions_result = await call_upstream_async("maps", gmaps.directions, origin, destination, mode=mode, departure_time=now)
     if not directions_result:
         return "No directions found."
     
@@ -217,10 +235,11 @@ async def get_directions(origin: str, destination: str, mode: str = "driving") -
             instructions: "\n".join(directions)
         }
 
+@instrument
 async def get_distance(origin: str, destination: str, mode: str = "driving") -> str:
     """Get distance between two locations. Make sure to convert response to human readable format."""
     now = datetime.now()
-    distance_result = gmaps.distance_matrix(origin, destination, mode=mode, departure_time=now)
+    distance_result = await call_upstream_async("maps", gmaps.distance_matrix, origin, destination, mode=mode, departure_time=now)
 
     if not distance_result:
         return "No distance found."
@@ -237,9 +256,10 @@ async def get_distance(origin: str, destination: str, mode: str = "driving") ->
             "duration": duration
         }
 
+@instrument
 async def get_places(query: str, location: dict, radius: int = 500) -> str:
     """Get places of interest around a location (which is the latitude and longitude of the input location). Make sure to convert response to human readable format."""
-    places_result = gmaps.places_nearby(location=location, keyword=query, radius=radius)
+    places_result = await call_upstream_async("maps", gmaps.places_nearby, location=location, keyword=query, radius=radius)
 
     if not places_result or 'results' not in places_result:
         return "No places found."
@@ -251,9 +271,10 @@ async def get_places(query: str, location: dict, radius: int = 500) -> str:
             "places": place_names
         }
 
+@instrument
 async def get_lat_long(address: str) -> dict:
     """Get latitude and longitude of a location."""
-    geocode_result = gmaps.geocode(address)
+    geocode_result = await call_upstream_async("maps", gmaps.geocode, address)
     if not geocode_result:
         return {"lat": None, "lng": None}
     
@@ -267,10 +288,13 @@ root_agent = LlmAgent(
     'Manage their files. You can list files, search files, read files on Google Drive.'\
     'You can also read, send & delete emails, and get the current user\'s information.'\
     'You can also get directions & distance between two locations (you can differentiate between driving and walking metrics), places of interest, and latitude/longitude of places in a location using Google Maps.'\
-    'To get nearby places, you will need the latitude and longitude of the location. Use the get_lat_long function to get the latitude and longitude of a location.',
+    'To get nearby places, you will need the latitude and longitude of the location. Use the get_lat_long function to get the latitude and longitude of a location.'\
+    ' Emails are listed one page at a time; pass nextCursor back as cursor only if more are needed. '\
+    'If a result contains "truncated": true, call get_more_results with its continuation only if the user needs the rest.',
     tools=[
         list_drive_files, read_drive_file, 
         get_current_user_email_id, send_email, get_emails, read_email_content, delete_email,
-        get_directions, get_distance, get_places, get_lat_long
+        get_directions, get_distance, get_places, get_lat_long,
+        get_more_results
     ],
 )
@@ -1,3 +1,4 @@
+import asyncio
 import datetime
 import zoneinfo
 from zoneinfo import ZoneInfo
@@ -11,28 +12,48 @@ from elevenlabs import play
 # Load environment variables from .env file
 load_dotenv()
 
-from typing import Optional, List, Dict
+from typing import Any, Optional, List, Dict
 import praw
 from praw.exceptions import PRAWException
 
 from fpdf import FPDF
 import io
 
-def get_weather(city: str) -> dict:
+from common.instrumentation import instrument
+from common.resilience import UpstreamUnavailableError, call_upstream_async
+from common.shaping import get_more_results, shape_items, shape_text
+
+WEATHER_API_URL = os.getenv("WEATHER_API_URL", "http://api.weatherapi.com/v1/current.json")
+# Optional Reddit endpoint overrides (e.g. a local stand-in); praw's defaults are used when unset.
+REDDIT_ENDPOINTS = {
+    key: value for key, value in {
+        "oauth_url": os.getenv("REDDIT_OAUTH_URL"),
+        "reddit_url": os.getenv("REDDIT_URL"),
+    }.items() if value
+}
+GEMINI_API_URL = os.getenv("GEMINI_API_URL", "https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent")
+UPSTREAM_TIMEOUT_SECONDS = 30
+
+def _request_json(method: str, url: str, **kwargs) -> dict:
+    """Sends one HTTP request and returns its JSON body, raising on error statuses so they can be retried."""
+    response = requests.request(method, url, timeout=UPSTREAM_TIMEOUT_SECONDS, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+@instrument
+async def get_weather(city: str) -> dict:
     api_key = os.getenv("WEATHER_API_KEY")
     if not api_key:
         raise ValueError("API key not found in environment variables")
 
-    base_url = "http://api.weatherapi.com/v1/current.json"
+    base_url = WEATHER_API_URL
     params = {
         "q": city,
         "key": api_key
     }
 
     try:
-        api_response = requests.get(base_url, params=params)
-        api_response.raise_for_status()
-        api_response = api_response.json()
+        api_response = await call_upstream_async("weatherapi", _request_json, "GET", base_url, params=params)
         condition = api_response["current"]["condition"]["text"]
         temp_c = api_response["current"]["temp_c"]
         temp_f = api_response["current"]["temp_f"]
@@ -45,10 +66,13 @@ def get_weather(city: str) -> dict:
                 f"{temp_c} degrees Celsius ({temp_f} degrees Fahrenheit)."
             ),
         }
-    except requests.RequestException as e:
+    except (requests.RequestException, UpstreamUnavailableError) as e:
         print(f"Error fetching weather data: {e}")
-        return None
+        # The request error includes the URL, and with it the API key, so it is not passed on
+        reason = str(e) if isinstance(e, UpstreamUnavailableError) else "the weather service did not respond successfully."
+        return {"status": "error", "error_message": f"Could not fetch the weather for {city}: {reason}"}
 
+@instrument
 def get_current_time(city: str) -> dict:
     city_normalized = city.strip().replace(" ", "_").lower()
     matching_zones = [
@@ -75,37 +99,46 @@ def get_current_time(city: str) -> dict:
     )
     return {"status": "success", "report": report}
 
-def translate_response(originalText: str, lang: str) -> dict:
+@instrument
+async def translate_response(originalText: str, lang: str) -> dict:
     try:
         api_key = os.getenv('GOOGLE_API_KEY')
-        base_url = 'https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent'
+        base_url = GEMINI_API_URL
         data = {"contents": [{
             "parts":[{"text": f"Convert the following text in {lang}: {originalText}"}]
             }]
         }
         headers = {'content-type': 'application/json'}
         params = { 'key': api_key }
-        api_response = requests.post(base_url, json=data, params=params, headers=headers );
-        return {"status": "success", "report": api_response.json()}
-    except e:
+        api_response = await call_upstream_async("gemini", _request_json, "POST", base_url, json=data, params=params, headers=headers)
+        # Return only the translated text, not the whole Gemini response envelope
+        parts = api_response["candidates"][0]["content"]["parts"]
+        translation = "".join(part.get("text", "") for part in parts)
+        return {"status": "success", **shape_text(translation, key="report")}
+    except (requests.RequestException, UpstreamUnavailableError, KeyError, IndexError, ValueError) as e:
         print(f"Error fetching translation data: {e}")
-        return None
+        reason = str(e) if isinstance(e, UpstreamUnavailableError) else "the translation service did not respond successfully."
+        return {"status": "error", "error_message": f"Could not translate the text: {reason}"}
     
-def get_voice_response(text: str):
+@instrument
+async def get_voice_response(text: str):
     client = ElevenLabs(
         api_key=os.getenv("ELEVENLABS_API_KEY"),
     )
-    audio = client.text_to_speech.convert(
+    # convert() streams lazily; read the audio inside the call so failures can be retried
+    audio = await call_upstream_async("elevenlabs", lambda: b"".join(client.text_to_speech.convert(
         text=text,
         voice_id="JBFqnCBsd6RMkjVDRZzb",
         model_id="eleven_multilingual_v2",
         output_format="mp3_44100_128",
-    )
-    play(audio);
+    )))
+    # Playback blocks until the audio ends, so keep it off the event loop
+    await asyncio.to_thread(play, audio)
     return {
         "status": "success",
     }
 
+@instrument
 def find_relevant_subreddits(topic: str) -> List[str]:
     """
     Provides relevant subreddits for a given topic based on predefined mappings
@@ -170,7 +203,7 @@ def find_relevant_subreddits(topic: str) -> List[str]:
     print(f"--- Found relevant subreddits: {found_subreddits} ---")
     return found_subreddits[:5]  # Return up to 5 subreddits
 
-def get_reddit_news(subreddit: str, topic: Optional[str] = None, limit: int = 10) -> Dict[str, List[Dict[str, str]]]:
+async def get_reddit_news(subreddit: str, topic: Optional[str] = None, limit: int = 10) -> Dict[str, List[Dict[str, str]]]:
     """
     Fetches posts from a specified subreddit using the Reddit API.
     Can optionally search for a specific topic within the subreddit.
@@ -202,23 +235,24 @@ def get_reddit_news(subreddit: str, topic: Optional[str] = None, limit: int = 10
             client_id=client_id,
             client_secret=client_secret,
             user_agent=user_agent,
+            **REDDIT_ENDPOINTS,
         )
         
         # Check if subreddit exists and is accessible
-        reddit.subreddits.search_by_name(subreddit, exact=False)
+        await call_upstream_async("reddit", reddit.subreddits.search_by_name, subreddit, exact=False)
         sub = reddit.subreddit(subreddit)
         
         # If topic is provided, search for it in the subreddit
         if topic:
             print(f"--- Searching r/{subreddit} for '{topic}' ---")
             # Search for the topic and sort by 'new' to get most recent content
-            posts_iterator = sub.search(topic, sort='new', time_filter='month', limit=limit)
+            fetch_posts = lambda: list(sub.search(topic, sort='new', time_filter='month', limit=limit))
         else:
             # Otherwise fetch new posts instead of hot posts to get more recent content
             print(f"--- Fetching newest posts from r/{subreddit} ---")
-            posts_iterator = sub.new(limit=limit)
+            fetch_posts = lambda: list(sub.new(limit=limit))
         
-        posts = list(posts_iterator)
+        posts = await call_upstream_async("reddit", fetch_posts)
         
         if not posts:
             error_msg = f"No posts found in r/{subreddit}" + (f" on topic '{topic}'" if topic else ".")
@@ -247,6 +281,11 @@ def get_reddit_news(subreddit: str, topic: Optional[str] = None, limit: int = 10
         print(f"--- Successfully fetched {len(formatted_posts)} posts from r/{subreddit} ---")
         return {subreddit: formatted_posts}
         
+    except UpstreamUnavailableError as e:
+        print(f"--- Tool error: {e} ---")
+        error_msg = f"Reddit is temporarily unavailable, so r/{subreddit} could not be fetched. {e}"
+        return {subreddit: [{"title": error_msg, "content": "", "url": "", "permalink": ""}]}
+
     except PRAWException as e:
         print(f"--- Tool error: Reddit API error for r/{subreddit}: {e} ---")
         error_msg = f"Error accessing r/{subreddit}. It might be private, banned, or non-existent. Details: {e}"
@@ -257,16 +296,21 @@ def get_reddit_news(subreddit: str, topic: Optional[str] = None, limit: int = 10
         error_msg = f"An unexpected error occurred while fetching from r/{subreddit}."
         return {subreddit: [{"title": error_msg, "content": "", "url": "", "permalink": ""}]}
 
-def get_news_by_topic(topic: str, limit: int = 10) -> Dict[str, List[Dict[str, str]]]:
+@instrument
+async def get_news_by_topic(topic: str, limit: int = 10, fields: str = "") -> Dict[str, Any]:
     """
     Searches for relevant subreddits on a topic and fetches news from them.
     
     Args:
         topic: The topic to find news about
         limit: Maximum number of posts per subreddit
+        fields: Optional comma-separated post fields to return
+                (subreddit, title, content, url, permalink). Defaults to all of them.
         
     Returns:
-        A dictionary with each subreddit name as key and a list of post details as value.
+        A dictionary with a 'posts' list; each post includes the subreddit it came from.
+        If the posts do not fit the result budget, 'truncated' is true and 'continuation'
+        can be passed to get_more_results to fetch the rest.
     """
     print(f"--- Tool called: Getting news on topic '{topic}' ---")
     
@@ -275,21 +319,26 @@ def get_news_by_topic(topic: str, limit: int = 10) -> Dict[str, List[Dict[str, s
     
     if not subreddits:
         print(f"--- No relevant subreddits found for '{topic}' ---")
-        return {"general": [{"title": f"No relevant subreddits found for '{topic}'", 
+        return {"posts": [{"subreddit": "general", "title": f"No relevant subreddits found for '{topic}'", 
                            "content": "", "url": "", "permalink": ""}]}
     
-    # Fetch news from each subreddit, searching for the topic
-    all_results = {}
-    for subreddit in subreddits[:3]:  # Limit to top 3 subreddits to avoid rate limiting
-        try:
-            result = get_reddit_news(subreddit, topic, limit=limit)
-            all_results.update(result)
-        except Exception as e:
-            print(f"--- Error fetching from r/{subreddit}: {e} ---")
-            all_results[subreddit] = [{"title": f"Error fetching from r/{subreddit}", 
-                                     "content": str(e), "url": "", "permalink": ""}]
+    # Fetch news from each subreddit concurrently, searching for the topic
+    subreddits = subreddits[:3]  # Limit to top 3 subreddits to avoid rate limiting
+    results = await asyncio.gather(
+        *(get_reddit_news(subreddit, topic, limit=limit) for subreddit in subreddits),
+        return_exceptions=True,
+    )
+    posts = []
+    for subreddit, result in zip(subreddits, results):
+        if isinstance(result, Exception):
+            print(f"--- Error fetching from r/{subreddit}: {result} ---")
+            result = {subreddit: [{"title": f"Error fetching from r/{subreddit}", 
+                                 "content": str(result), "url": "", "permalink": ""}]}
+        for name, subreddit_posts in result.items():
+            posts.extend({"subreddit": name, **post} for post in subreddit_posts)
     
-    return all_results
+    # Keep the posts within the result budget; the rest stay available through get_more_results
+    return shape_items(posts, key="posts", fields=fields)
 
 def generate_pdf(text_content: str):
     pdf = FPDF()
@@ -307,6 +356,7 @@ def generate_pdf(text_content: str):
     pdf_byte_buffer.seek(0) # Rewind the buffer to the beginning
     return pdf_byte_buffer.getvalue()
 
+@instrument
 def save_text_as_pdf(content_to_save: str, filename: str = "document.pdf") -> Dict[str, str]:
     """
     Generates a PDF from the given text content and saves it locally.
@@ -380,8 +430,11 @@ root_agent = Agent(
         "confirm the content they want to save.\n"
         "- Call the `save_text_as_pdf` tool with the relevant text content and a descriptive filename (e.g., 'london_weather.pdf', 'tech_news_summary.pdf').\n"
         "- Inform the user if the PDF was saved successfully and what the artifact name is, or if an error occurred.\n\n"
+        "LARGE RESULTS:\n"
+        "- If a tool result contains 'truncated': true, only part of it was returned. "
+        "Call `get_more_results` with its 'continuation' value only if the user needs more.\n\n"
         "IMPORTANT: Always prioritize real news from Reddit. You MUST call an appropriate tool first before presenting any news. "
         "When saving to PDF, ensure you have the text content ready from a previous step or tool call."
     ),
-    tools=[get_weather, get_current_time, translate_response, get_voice_response, find_relevant_subreddits, get_news_by_topic, save_text_as_pdf],
+    tools=[get_weather, get_current_time, translate_response, get_voice_response, find_relevant_subreddits, get_news_by_topic, save_text_as_pdf, get_more_results],
 )
\ No newline at end of file
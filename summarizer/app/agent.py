@@ -1,4 +1,15 @@
+from typing import Optional
+
 from google.adk.agents import Agent 
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.models import LlmRequest, LlmResponse
+from google.genai import types
+
+from .pipeline import GeminiBackend, count_words, reduction_stats, summarize_long_document
+
+MODEL = "gemini-2.0-flash"
+# Input longer than this is summarized by the map-reduce pipeline instead of in one model turn.
+LONG_DOCUMENT_WORDS = 20000
 
 def compute_word_reduction(original_text: str, summarized_text: str) -> dict:
     """
@@ -13,25 +24,51 @@ def compute_word_reduction(original_text: str, summarized_text: str) -> dict:
         dict: A dictionary containing original word count, new word count,
               and percentage reduction.
     """
-    original_count = len(original_text.split())
-    new_count = len(summarized_text.split())
+    original_count = count_words(original_text)
+    new_count = count_words(summarized_text)
+
+    return reduction_stats(original_count, new_count)
+
+
+def _content_text(content: types.Content) -> str:
+    return "".join(part.text or "" for part in content.parts or [])
+
+
+async def summarize_long_input(callback_context: CallbackContext, llm_request: LlmRequest) -> Optional[LlmResponse]:
+    """
+    Routes input too long for a single model turn through `summarize_long_document`.
+
+    Earlier oversized messages in the session are replaced with a short note,
+    so follow-up turns do not resend them. If the latest message is oversized,
+    the pipeline's summary and word reduction stats are returned as the
+    model's reply and the model is not called.
+    """
+    contents = llm_request.contents or []
+    for content in contents[:-1]:
+        if content.role == "user" and count_words(_content_text(content)) > LONG_DOCUMENT_WORDS:
+            content.parts = [types.Part(text="[A long document, already summarized in an earlier reply.]")]
 
-    if original_count == 0:
-        reduction = 0
-    else:
-        reduction = ((original_count - new_count) / original_count) * 100
+    if not contents or contents[-1].role != "user":
+        return None
+    text = _content_text(contents[-1])
+    if count_words(text) <= LONG_DOCUMENT_WORDS:
+        return None
 
-    return {
-        "original_word_count": original_count,
-        "new_word_count": new_count,
-        "percentage_reduction": round(reduction, 2)
-    }
+    print(f"--- Input exceeds {LONG_DOCUMENT_WORDS} words, summarizing with the map-reduce pipeline ---")
+    result = await summarize_long_document(text, GeminiBackend(llm_request.model or MODEL))
+    reply = (
+        f"{result['summary']}\n\n"
+        f"Original words: {result['original_word_count']}, summary words: {result['new_word_count']}, "
+        f"reduction: {result['percentage_reduction']}% "
+        f"(summarized in {result['chunk_count']} sections)."
+    )
+    return LlmResponse(content=types.Content(role="model", parts=[types.Part(text=reply)]))
 
 
 # Summarizer Agent
 root_agent = Agent(
     name="summarizer",
-    model="gemini-2.0-flash",
+    model=MODEL,
     description="Agent that summarizes input text and computes word reduction statistics.",
     instruction=(
         "You are a concise summarization assistant. "
@@ -43,5 +80,7 @@ root_agent = Agent(
         "human-friendly, easy-to-read response."
     ),
     # Only include the necessary tool for computation.
-    tools=[compute_word_reduction] 
+    tools=[compute_word_reduction],
+    # Documents too long for one model turn are summarized chunk by chunk.
+    before_model_callback=summarize_long_input,
 )
@@ -0,0 +1,271 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Dict, Iterator, List, Set
+
+from common.stats import percentile
+
+from .agent import compute_word_reduction
+from .pipeline import (
+    DEFAULT_CHUNK_WORDS,
+    DEFAULT_CONCURRENCY,
+    FakeBackend,
+    GeminiBackend,
+    summarize_long_document,
+)
+
+DOCUMENT_EXTENSIONS = (".txt", ".md")
+
+
+def iter_documents(path: str) -> Iterator[Dict[str, str]]:
+    """
+    Streams documents from a JSONL file or a directory of text files.
+
+    JSONL lines must contain a "text" field and may contain an "id" field
+    (the line number is used otherwise). In a directory, every .txt/.md file
+    is a document whose id is its path relative to the directory.
+
+    A document that cannot be read (malformed JSON, no "text", not UTF-8) is
+    yielded with an "error" message instead of "text", so one bad record does
+    not end the run.
+
+    Args:
+        path (str): Path to a .jsonl file or a directory.
+
+    Yields:
+        dict: A document with "id" and either "text" or "error" keys.
+    """
+    if os.path.isdir(path):
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if not name.lower().endswith(DOCUMENT_EXTENSIONS):
+                    continue
+                file_path = os.path.join(root, name)
+                document_id = os.path.relpath(file_path, path)
+                try:
+                    with open(file_path, encoding="utf-8") as f:
+                        text = f.read()
+                except (OSError, UnicodeDecodeError) as e:
+                    yield {"id": document_id, "error": f"could not read file: {e}"}
+                    continue
+                yield {"id": document_id, "text": text}
+        return
+
+    # Read bytes and decode line by line, so one invalid line does not stop the file.
+    with open(path, "rb") as f:
+        for line_number, raw_line in enumerate(f, start=1):
+            if not raw_line.strip():
+                continue
+            try:
+                record = json.loads(raw_line.decode("utf-8"))
+            except (UnicodeDecodeError, ValueError) as e:
+                yield {"id": str(line_number), "error": f"invalid JSON on line {line_number}: {e}"}
+                continue
+            if not isinstance(record, dict):
+                yield {"id": str(line_number), "error": f"line {line_number} is not a JSON object"}
+                continue
+            document_id = str(record.get("id", line_number))
+            if not isinstance(record.get("text"), str):
+                yield {"id": document_id, "error": f"line {line_number} has no \"text\" string"}
+                continue
+            yield {"id": document_id, "text": record["text"]}
+
+
+def load_checkpoint(output_path: str) -> Set[str]:
+    """Returns the ids already written to `output_path` by a previous run."""
+    done = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                done.add(json.loads(line)["id"])
+            except (ValueError, KeyError):
+                # A crash can leave the last line half written; that document is redone.
+                continue
+    return done
+
+
+class RateLimiter:
+    """Spaces out the start of summaries to at most `rate` per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_start - now
+            self._next_start = max(now, self._next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+async def run_batch(
+    input_path: str,
+    output_path: str,
+    backend=None,
+    workers: int = 4,
+    rate: float = 0.0,
+    chunk_words: int = DEFAULT_CHUNK_WORDS,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> dict:
+    """
+    Summarizes every document in `input_path`, appending results to `output_path`.
+
+    Each result is written and flushed as soon as it is ready, so the output
+    file doubles as the checkpoint: documents whose id is already in it are
+    skipped, and a crashed run resumes where it stopped. Failed documents are
+    not written and are retried on the next run; unreadable input records
+    are logged and counted as errors.
+
+    Args:
+        input_path (str): A .jsonl file or a directory of text files.
+        output_path (str): JSONL file results are appended to.
+        backend: Model backend passed to `summarize_long_document`.
+        workers (int): Number of documents summarized concurrently.
+        rate (float): Maximum documents started per second (0 for no limit).
+        chunk_words (int): Maximum words sent to the model in one call.
+        concurrency (int): Maximum model calls in flight per document.
+
+    Returns:
+        dict: Throughput, token usage and latency percentiles for the run.
+    """
+    backend = backend or GeminiBackend()
+    limiter = RateLimiter(rate)
+    done = load_checkpoint(output_path)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=workers * 2)
+    latencies: List[float] = []
+    totals = {
+        "processed": 0,
+        "skipped": 0,
+        "errors": 0,
+        "input_tokens": 0,
+        "output_tokens": 0,
+        "original_words": 0,
+        "summary_words": 0,
+    }
+
+    # Terminate a half-written last line so new records start on their own line.
+    if os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    else:
+        needs_newline = False
+
+    async def produce():
+        for document in iter_documents(input_path):
+            if document["id"] in done:
+                totals["skipped"] += 1
+                continue
+            if "error" in document:
+                print(f"--- Skipping document '{document['id']}': {document['error']} ---")
+                totals["errors"] += 1
+                continue
+            await queue.put(document)
+        for _ in range(workers):
+            await queue.put(None)
+
+    async def work(output):
+        while True:
+            document = await queue.get()
+            if document is None:
+                return
+            await limiter.wait()
+            started = time.perf_counter()
+            try:
+                result = await summarize_long_document(
+                    document["text"], backend, chunk_words=chunk_words, concurrency=concurrency
+                )
+            except Exception as e:
+                print(f"--- Error summarizing document '{document['id']}': {e} ---")
+                totals["errors"] += 1
+                continue
+            latency = time.perf_counter() - started
+
+            stats = compute_word_reduction(document["text"], result["summary"])
+            output.write(json.dumps({
+                "id": document["id"],
+                "summary": result["summary"],
+                **stats,
+                "chunk_count": result["chunk_count"],
+                "model_calls": result["model_calls"],
+                "input_tokens": result["input_tokens"],
+                "output_tokens": result["output_tokens"],
+                "latency_s": round(latency, 4),
+            }) + "\n")
+            output.flush()
+
+            latencies.append(latency)
+            totals["processed"] += 1
+            totals["input_tokens"] += result["input_tokens"]
+            totals["output_tokens"] += result["output_tokens"]
+            totals["original_words"] += stats["original_word_count"]
+            totals["summary_words"] += stats["new_word_count"]
+
+    started = time.perf_counter()
+    with open(output_path, "a", encoding="utf-8") as output:
+        if needs_newline:
+            output.write("\n")
+        await asyncio.gather(produce(), *(work(output) for _ in range(workers)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        **totals,
+        "elapsed_s": round(elapsed, 3),
+        "docs_per_sec": round(totals["processed"] / elapsed, 3) if elapsed else 0.0,
+        "latency_p50_s": round(percentile(latencies, 50), 4),
+        "latency_p90_s": round(percentile(latencies, 90), 4),
+        "latency_p99_s": round(percentile(latencies, 99), 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a batch of documents.")
+    parser.add_argument("input", help="JSONL file ({\"id\", \"text\"} per line) or directory of .txt/.md files.")
+    parser.add_argument("output", help="JSONL file results are appended to; also used to resume.")
+    parser.add_argument("--workers", type=int, default=4, help="Documents summarized concurrently.")
+    parser.add_argument("--rate", type=float, default=0.0, help="Maximum documents started per second (0 = unlimited).")
+    parser.add_argument("--chunk-words", type=int, default=DEFAULT_CHUNK_WORDS)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Model calls in flight per document.")
+    parser.add_argument("--fake", action="store_true", help="Use the offline fake model backend.")
+    parser.add_argument("--fake-latency", type=float, default=0.05, help="Seconds per fake model call.")
+    parser.add_argument("--report", help="Also write the run report as JSON to this path.")
+    args = parser.parse_args()
+
+    backend = FakeBackend(args.fake_latency) if args.fake else GeminiBackend()
+    report = asyncio.run(run_batch(
+        args.input,
+        args.output,
+        backend,
+        workers=args.workers,
+        rate=args.rate,
+        chunk_words=args.chunk_words,
+        concurrency=args.concurrency,
+    ))
+
+    print(
+        f"--- Summarized {report['processed']} documents in {report['elapsed_s']}s "
+        f"({report['docs_per_sec']} docs/sec), skipped {report['skipped']}, errors {report['errors']} ---"
+    )
+    print(f"--- Tokens: {report['input_tokens']} input, {report['output_tokens']} output ---")
+    print(
+        f"--- Latency: p50 {report['latency_p50_s']}s, p90 {report['latency_p90_s']}s, "
+        f"p99 {report['latency_p99_s']}s ---"
+    )
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+import asyncio
+import io
+import itertools
+import re
+from typing import Dict, Iterable, Iterator, List, Union
+
+from dotenv import load_dotenv
+from google import genai
+from google.genai import types
+
+load_dotenv()
+
+# Final summaries must stay under this many words (matches the agent instruction).
+SUMMARY_WORD_LIMIT = 30
+DEFAULT_CHUNK_WORDS = 1500
+DEFAULT_CHUNK_SUMMARY_WORDS = 80
+DEFAULT_CONCURRENCY = 4
+
+MAP_INSTRUCTION = (
+    "You summarize one section of a longer document. "
+    "Write at most {max_words} words. Keep names, numbers and conclusions. "
+    "Do not add any commentary."
+)
+REDUCE_INSTRUCTION = (
+    "You are given summaries of consecutive sections of one document. "
+    "Merge them into a single summary of at most {max_words} words. "
+    "Do not add any commentary."
+)
+FINAL_INSTRUCTION = (
+    "You are a concise summarization assistant. "
+    "Summarize the provided text in **less than {max_words} words**. "
+    "Do not add any commentary."
+)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"\S+")
+_WORD_AND_SPACE = re.compile(r"\S+\s*")
+
+TextSource = Union[str, Iterable[str]]
+
+
+def count_words(source: TextSource, block_size: int = 1 << 16) -> int:
+    """
+    Counts whitespace-separated words without building a list of the words.
+
+    Args:
+        source (str | Iterable[str]): A string, or any iterable of text blocks
+            such as an open file.
+        block_size (int): Size of the slices a string is scanned in.
+
+    Returns:
+        int: The number of words, identical to len(text.split()).
+    """
+    if isinstance(source, str):
+        text = source
+        source = (text[i:i + block_size] for i in range(0, len(text), block_size))
+
+    count = 0
+    in_word = False
+    for block in source:
+        if not block:
+            continue
+        # subn counts matches in C, without a match object per word or a list of words.
+        words = _WORD_AND_SPACE.subn("", block)[1]
+        # A word that straddles two blocks was counted once in each.
+        if words and in_word and not block[0].isspace():
+            words -= 1
+        count += words
+        in_word = not block[-1].isspace()
+    return count
+
+
+def reduction_stats(original_count: int, new_count: int) -> dict:
+    """Builds the word reduction stats returned by `compute_word_reduction`."""
+    if original_count == 0:
+        reduction = 0
+    else:
+        reduction = ((original_count - new_count) / original_count) * 100
+
+    return {
+        "original_word_count": original_count,
+        "new_word_count": new_count,
+        "percentage_reduction": round(reduction, 2)
+    }
+
+
+def _iter_paragraphs(lines: Iterable[str]) -> Iterator[str]:
+    paragraph = []
+    for line in lines:
+        if line.strip():
+            paragraph.append(line)
+        elif paragraph:
+            yield "".join(paragraph).strip()
+            paragraph = []
+    if paragraph:
+        yield "".join(paragraph).strip()
+
+
+def _iter_sentences(paragraph: str) -> Iterator[str]:
+    start = 0
+    for match in _SENTENCE_END.finditer(paragraph):
+        yield paragraph[start:match.start()]
+        start = match.end()
+    yield paragraph[start:]
+
+
+def _split_words(text: str, max_words: int) -> Iterator[str]:
+    """Cuts `text` into pieces of `max_words` words, walking the matches instead of splitting."""
+    start = end = 0
+    words = 0
+    for match in _WORD.finditer(text):
+        if words == 0:
+            start = match.start()
+        end = match.end()
+        words += 1
+        if words == max_words:
+            yield text[start:end]
+            words = 0
+    if words:
+        yield text[start:end]
+
+
+def _split_oversized(paragraph: str, max_words: int) -> Iterator[str]:
+    """Splits a paragraph on sentence boundaries, and words as a last resort."""
+    if count_words(paragraph) <= max_words:
+        yield paragraph
+        return
+
+    group: List[str] = []
+    group_words = 0
+    for sentence in _iter_sentences(paragraph):
+        words = count_words(sentence)
+        if words > max_words:
+            if group:
+                yield " ".join(group)
+                group, group_words = [], 0
+            yield from _split_words(sentence, max_words)
+            continue
+        if group and group_words + words > max_words:
+            yield " ".join(group)
+            group, group_words = [], 0
+        group.append(sentence)
+        group_words += words
+    if group:
+        yield " ".join(group)
+
+
+def iter_chunks(source: TextSource, max_words: int = DEFAULT_CHUNK_WORDS) -> Iterator[str]:
+    """
+    Lazily splits a document into chunks of at most `max_words` words.
+
+    Chunks are cut on paragraph boundaries where possible, then on sentence
+    boundaries, so only the chunk being built is held in memory.
+
+    Args:
+        source (str | Iterable[str]): The document text, or an iterable of
+            lines such as an open file.
+        max_words (int): Maximum number of words per chunk.
+
+    Yields:
+        str: The next chunk of the document.
+    """
+    lines = io.StringIO(source) if isinstance(source, str) else source
+
+    chunk: List[str] = []
+    chunk_words = 0
+    for paragraph in _iter_paragraphs(lines):
+        for piece in _split_oversized(paragraph, max_words):
+            words = count_words(piece)
+            if chunk and chunk_words + words > max_words:
+                yield "\n\n".join(chunk)
+                chunk, chunk_words = [], 0
+            chunk.append(piece)
+            chunk_words += words
+    if chunk:
+        yield "\n\n".join(chunk)
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeBackend:
+    """
+    Offline stand-in for the model, used to benchmark the pipeline.
+
+    It echoes the leading words of its input after `latency` seconds, and
+    reports token usage estimated from the text length.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    async def generate(self, instruction: str, text: str, max_words: int) -> dict:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        words = []
+        for match in re.finditer(r"\S+", text):
+            words.append(match.group())
+            if len(words) == max_words:
+                break
+        summary = " ".join(words)
+        return {
+            "text": summary,
+            "input_tokens": _estimate_tokens(instruction) + _estimate_tokens(text),
+            "output_tokens": _estimate_tokens(summary),
+        }
+
+
+class GeminiBackend:
+    """Calls Gemini through the google-genai client configured by the .env file."""
+
+    def __init__(self, model: str = "gemini-2.0-flash"):
+        self.model = model
+        self._client = None
+
+    async def generate(self, instruction: str, text: str, max_words: int) -> dict:
+        if self._client is None:
+            self._client = genai.Client()
+        response = await self._client.aio.models.generate_content(
+            model=self.model,
+            contents=text,
+            config=types.GenerateContentConfig(system_instruction=instruction),
+        )
+        usage = response.usage_metadata
+        return {
+            "text": (response.text or "").strip(),
+            "input_tokens": (usage and usage.prompt_token_count) or 0,
+            "output_tokens": (usage and usage.candidates_token_count) or 0,
+        }
+
+
+async def _gather_or_cancel(*coros) -> list:
+    """Like asyncio.gather, but cancels the other tasks as soon as one fails."""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        # Wait for the cancellations so no model call outlives the failed document.
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def summarize_long_document(
+    source: TextSource,
+    backend=None,
+    chunk_words: int = DEFAULT_CHUNK_WORDS,
+    chunk_summary_words: int = DEFAULT_CHUNK_SUMMARY_WORDS,
+    concurrency: int = DEFAULT_CONCURRENCY,
+) -> dict:
+    """
+    Summarizes a document of any length with a map-reduce pipeline.
+
+    The document is streamed into chunks, each chunk is summarized with at
+    most `concurrency` model calls in flight, and the chunk summaries are
+    merged until a single summary of less than 30 words remains.
+
+    Args:
+        source (str | Iterable[str]): The document text, or an iterable of lines.
+        backend: Object with an async `generate(instruction, text, max_words)`
+            method. Defaults to `GeminiBackend`.
+        chunk_words (int): Maximum words sent to the model in one call.
+        chunk_summary_words (int): Target length of each intermediate summary.
+        concurrency (int): Maximum number of model calls in flight.
+
+    Returns:
+        dict: The summary, word reduction stats, and chunk/token usage counts.
+    """
+    if chunk_summary_words * 2 > chunk_words:
+        raise ValueError("chunk_summary_words must be at most half of chunk_words")
+
+    backend = backend or GeminiBackend()
+    semaphore = asyncio.Semaphore(concurrency)
+    usage = {"model_calls": 0, "input_tokens": 0, "output_tokens": 0}
+
+    async def call(instruction: str, text: str, max_words: int) -> str:
+        async with semaphore:
+            result = await backend.generate(instruction.format(max_words=max_words), text, max_words)
+        usage["model_calls"] += 1
+        usage["input_tokens"] += result["input_tokens"]
+        usage["output_tokens"] += result["output_tokens"]
+        return result["text"]
+
+    chunk_iter = iter_chunks(source, chunk_words)
+    first = next(chunk_iter, None)
+    second = next(chunk_iter, None)
+
+    if first is None:
+        return {"summary": "", "chunk_count": 0, **usage, **reduction_stats(0, 0)}
+
+    if second is None:
+        # A document that fits in one chunk goes straight to the final prompt.
+        original_count = count_words(first)
+        chunk_count = 1
+        summary = await call(FINAL_INSTRUCTION, first, SUMMARY_WORD_LIMIT)
+    else:
+        # Map: workers pull from the shared chunk iterator, so only in-flight
+        # chunks are held in memory.
+        chunks = enumerate(itertools.chain((first, second), chunk_iter))
+        summaries: Dict[int, str] = {}
+        word_counts: Dict[int, int] = {}
+
+        async def worker():
+            for index, chunk in chunks:
+                word_counts[index] = count_words(chunk)
+                summaries[index] = await call(MAP_INSTRUCTION, chunk, chunk_summary_words)
+
+        await _gather_or_cancel(*(worker() for _ in range(concurrency)))
+        original_count = sum(word_counts.values())
+        chunk_count = len(summaries)
+
+        # Reduce: merge groups of summaries until they fit in one prompt.
+        layer = [summaries[index] for index in range(chunk_count)]
+        layer_words = count_words("\n\n".join(layer))
+        while layer_words > chunk_words:
+            groups = iter_chunks("\n\n".join(layer), chunk_words)
+            layer = await _gather_or_cancel(
+                *(call(REDUCE_INSTRUCTION, group, chunk_summary_words) for group in groups)
+            )
+            reduced_words = count_words("\n\n".join(layer))
+            if reduced_words >= layer_words:
+                break
+            layer_words = reduced_words
+        summary = await call(FINAL_INSTRUCTION, "\n\n".join(layer), SUMMARY_WORD_LIMIT)
+
+    # Models occasionally overshoot the limit; trim rather than return a long summary.
+    words = summary.split()
+    if len(words) >= SUMMARY_WORD_LIMIT:
+        summary = " ".join(words[:SUMMARY_WORD_LIMIT - 1])
+
+    return {
+        "summary": summary,
+        "chunk_count": chunk_count,
+        **usage,
+        **reduction_stats(original_count, count_words(summary)),
+    }
+
@@ -0,0 +1,15 @@
+from common.stats import percentile
+
+
+def test_percentile_uses_nearest_rank():
+    assert percentile([1, 2, 3, 4, 5], 50) == 3
+    assert percentile([1, 2, 3, 4, 5], 90) == 5
+    assert percentile([1, 2, 3, 4, 5, 6, 7], 90) == 7
+    assert percentile(list(range(1, 101)), 95) == 95
+
+
+def test_percentile_edges():
+    assert percentile([], 50) == 0.0
+    assert percentile([4.2], 99) == 4.2
+    assert percentile([1, 2, 3], 0) == 1
+    assert percentile([1, 2, 3], 100) == 3